@@ -0,0 +1,133 @@
+# cache.py
+# Small per-process caches for hot lookups (tenant by code, user by id).
+#
+# Every uvicorn worker has its own copy, so a write made by one worker must
+# invalidate the others. Each cached table has a row in cache_versions that
+# is bumped in the same transaction as any ORM write to that table (see
+# models._bump_cache_versions). Each process keeps one dedicated connection
+# for reading those counters; when a table's counter moves, that table's
+# cache is dropped. Other writes (contacts, job progress, heartbeats) leave
+# the caches alone.
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+from .database import engine
+
+POLL_INTERVAL = float(os.getenv("CRM_CACHE_POLL_SECONDS", "0"))
+MAX_ENTRIES = int(os.getenv("CRM_CACHE_MAX_ENTRIES", "1024"))
+
+
+class TableVersionWatcher:
+    def __init__(self, database_path: str, poll_interval: float = POLL_INTERVAL):
+        self.database_path = database_path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._versions = {}
+        self._checked_at = {}
+
+    def _connection(self):
+        # Connections must not be shared across fork(), so reopen per pid.
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.database_path, check_same_thread=False)
+            self._pid = os.getpid()
+            self._versions = {}
+            self._checked_at = {}
+        return self._conn
+
+    def version(self, scope: str):
+        """
+        Current version of a cached table, re-read at most once per
+        poll_interval. None if it can't be read (tables not created yet).
+        """
+        with self._lock:
+            now = time.monotonic()
+            conn = self._connection()
+            if scope in self._versions and now - self._checked_at[scope] < self.poll_interval:
+                return self._versions[scope]
+
+            try:
+                row = conn.execute(
+                    "SELECT version FROM cache_versions WHERE scope = ?", (scope,)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                return None
+            self._versions[scope] = row[0] if row else 0
+            self._checked_at[scope] = now
+            return self._versions[scope]
+
+
+class VersionedCache:
+    def __init__(self, watcher: TableVersionWatcher, scope: str, max_entries: int = MAX_ENTRIES):
+        self.watcher = watcher
+        self.scope = scope
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = {}
+        self._version = None
+
+    def get(self, key, loader):
+        """
+        Return the cached value for key, calling loader() on a miss.
+        None results are not cached.
+        """
+        version = self.watcher.version(self.scope)
+        if version is None:
+            return loader()
+
+        with self._lock:
+            if version != self._version:
+                self._data.clear()
+                self._version = version
+            if key in self._data:
+                return self._data[key]
+
+        value = loader()
+        if value is None:
+            return None
+
+        with self._lock:
+            if self._version == version:
+                if len(self._data) >= self.max_entries:
+                    self._data.clear()
+                self._data[key] = value
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._version = None
+
+
+watcher = TableVersionWatcher(engine.url.database)
+tenant_cache = VersionedCache(watcher, "tenants")
+user_cache = VersionedCache(watcher, "users")
+
+
+# ---------- SNAPSHOTS ----------
+# Plain objects, not ORM rows: a cached row would be detached from the
+# session that loaded it and blow up on lazy loads / expiry.
+def tenant_snapshot(tenant):
+    if tenant is None:
+        return None
+    return SimpleNamespace(
+        id=tenant.id,
+        name=tenant.name,
+        code=tenant.code,
+        primary_color=tenant.primary_color,
+    )
+
+def user_snapshot(user):
+    if user is None:
+        return None
+    return SimpleNamespace(
+        id=user.id,
+        full_name=user.full_name,
+        email=user.email,
+        role=user.role,
+        tenant_id=user.tenant_id,
+    )
@@ -1,13 +1,20 @@
 # crud.py
+import json
 from typing import List, Optional
 from sqlalchemy import or_
-from sqlalchemy.orm import Session
-from . import models, schemas
+from sqlalchemy.orm import Session, contains_eager
+from . import cache, models, schemas
 
 # ---------- TENANTS ----------
 def get_tenant_by_code(db: Session, code: str):
     return db.query(models.Tenant).filter(models.Tenant.code == code).first()
 
+def get_cached_tenant_by_code(db: Session, code: str):
+    """Read-only tenant snapshot, shared across requests in this worker."""
+    return cache.tenant_cache.get(
+        code, lambda: cache.tenant_snapshot(get_tenant_by_code(db, code))
+    )
+
 def get_all_tenants(db: Session):
     return db.query(models.Tenant).all()
 
@@ -22,6 +29,13 @@ def create_tenant(db: Session, name: str, code: str, primary_color: str = None):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
+def get_cached_user(db: Session, user_id: int):
+    """Read-only user snapshot, shared across requests in this worker."""
+    return cache.user_cache.get(
+        user_id,
+        lambda: cache.user_snapshot(db.query(models.User).filter(models.User.id == user_id).first()),
+    )
+
 def get_all_users(db: Session):
     return db.query(models.User).all()
 
@@ -107,7 +121,8 @@ def create_contact(db: Session, contact_in: schemas.ContactCreate, tenant):
 
 def list_contacts(db: Session, tenant, search: Optional[str] = None):
     query = db.query(models.Contact).filter(models.Contact.tenant_id == tenant.id)
-    query = query.outerjoin(models.Company)
+    # Reuse the join to fill contact.company, instead of one query per contact
+    query = query.outerjoin(models.Company).options(contains_eager(models.Contact.company))
 
     if search:
         like = f"%{search}%"
@@ -149,3 +164,62 @@ def create_customer(db: Session, customer_in: schemas.CustomerCreate, tenant):
 def get_customers(db: Session, tenant):
     contacts = list_contacts(db, tenant)
     return [contact_to_contact_out(c) for c in contacts]
+
+# ---------- JOBS ----------
+def create_job(db: Session, kind: str, tenant=None, created_by: Optional[int] = None):
+    job = models.Job(
+        kind=kind,
+        status="queued",
+        tenant_id=tenant.id if tenant else None,
+        created_by=created_by,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_job(db: Session, job_id: int):
+    return db.query(models.Job).filter(models.Job.id == job_id).first()
+
+def list_jobs(db: Session, tenant_id: Optional[int] = None, status: Optional[str] = None,
+              limit: int = 50, offset: int = 0):
+    query = db.query(models.Job)
+    if tenant_id is not None:
+        query = query.filter(models.Job.tenant_id == tenant_id)
+    if status:
+        query = query.filter(models.Job.status == status)
+    return query.order_by(models.Job.id.desc()).offset(offset).limit(limit).all()
+
+def job_to_job_summary(job):
+    return schemas.JobSummaryOut(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        progress=job.progress or 0,
+        total=job.total,
+        message=job.message,
+        error=job.error,
+        cancel_requested=bool(job.cancel_requested),
+        tenant_id=job.tenant_id,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+def job_to_job_out(job):
+    result = json.loads(job.result) if job.result else None
+    return schemas.JobOut(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        progress=job.progress or 0,
+        total=job.total,
+        message=job.message,
+        result=result,
+        error=job.error,
+        cancel_requested=bool(job.cancel_requested),
+        tenant_id=job.tenant_id,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
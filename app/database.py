@@ -1,13 +1,29 @@
-from sqlalchemy import create_engine
+import os
+import threading
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./crm.db"
+DATABASE_URL = os.getenv("CRM_DATABASE_URL", "sqlite:///./crm.db")
+BUSY_TIMEOUT_MS = 5000
 
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False},
 )
 
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets several uvicorn workers read while one writes;
+    # busy_timeout makes writers wait for the lock instead of failing.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
@@ -22,3 +38,50 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ---------- LAZY SCHEMA INIT ----------
+_init_lock = threading.Lock()
+_initialized = False
+
+def init_db():
+    """
+    Create missing tables once per process. Called from app startup rather
+    than at import time, so importing the app stays cheap.
+    """
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        from . import models  # noqa: F401  (register tables on Base)
+        try:
+            Base.metadata.create_all(bind=engine)
+        except OperationalError as exc:
+            # Another worker won the race between "check" and "create".
+            if "already exists" not in str(exc):
+                raise
+            Base.metadata.create_all(bind=engine)
+        _add_missing_columns()
+        _initialized = True
+
+
+def _add_missing_columns():
+    """
+    create_all() only creates missing tables. Nullable columns added to a
+    model later (e.g. jobs.worker, jobs.heartbeat_at) are added here so an
+    existing crm.db keeps working.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                ddl_type = column.type.compile(dialect=engine.dialect)
+                try:
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl_type}")
+                except OperationalError as exc:
+                    # Another worker added it first.
+                    if "duplicate column" not in str(exc):
+                        raise
@@ -0,0 +1,504 @@
+# jobs.py
+# In-process background jobs. Job rows live in the same database as the CRM
+# data; a small dispatcher thread claims queued rows and hands them to a
+# bounded thread pool, so heavy tenant work never runs on the request path.
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from . import crud, database, models
+from .database import SessionLocal, engine
+
+MAX_WORKERS = int(os.getenv("CRM_JOB_WORKERS", "2"))
+PER_TENANT_LIMIT = int(os.getenv("CRM_JOB_PER_TENANT", "1"))
+POLL_INTERVAL = float(os.getenv("CRM_JOB_POLL_SECONDS", "2"))
+EXPORT_DIR = os.getenv("CRM_EXPORT_DIR", "./exports")
+PROGRESS_LOCK_WAIT_MS = 200
+# A running job whose heartbeat is older than this is considered orphaned.
+LEASE_SECONDS = float(os.getenv("CRM_JOB_LEASE_SECONDS", "60"))
+# Finished jobs (and their export files) are deleted after this many days.
+RETENTION_DAYS = float(os.getenv("CRM_JOB_RETENTION_DAYS", "30"))
+PURGE_INTERVAL = 3600
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+# Handler sessions keep loaded rows usable after a commit; otherwise every
+# commit would expire them and the next attribute access re-queries the row.
+JobSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=engine
+)
+
+
+def _update_job(job_id: int, *conditions, best_effort: bool = False, **values):
+    """
+    Write job bookkeeping on its own short-lived connection, so it never
+    commits (or expires) the handler's unit of work. Returns rows updated.
+
+    best_effort: only wait briefly for the write lock and skip the write if
+    it's taken (e.g. the handler itself holds it with flushed changes).
+    """
+    statement = (
+        update(models.Job)
+        .where(models.Job.id == job_id, *conditions)
+        .values(**values)
+    )
+    with engine.connect() as conn:
+        if best_effort:
+            conn.exec_driver_sql(f"PRAGMA busy_timeout={PROGRESS_LOCK_WAIT_MS}")
+        try:
+            result = conn.execute(statement)
+            conn.commit()
+            return result.rowcount
+        except OperationalError:
+            conn.rollback()
+            if not best_effort:
+                raise
+            return 0
+        finally:
+            if best_effort:
+                conn.exec_driver_sql(f"PRAGMA busy_timeout={database.BUSY_TIMEOUT_MS}")
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobInterrupted(Exception):
+    """The worker is shutting down; not the same as a user cancel."""
+    pass
+
+
+# ---------- HANDLER REGISTRY ----------
+HANDLERS = {}
+
+def job_handler(kind: str, needs_tenant: bool = True):
+    """
+    Register a function as the handler for a job kind.
+    The handler is called as handler(ctx) and may return a JSON-able result.
+    """
+    def decorator(fn):
+        HANDLERS[kind] = (fn, needs_tenant)
+        return fn
+    return decorator
+
+
+class JobContext:
+    """
+    What a running handler gets: its own DB session, the job row, the tenant
+    (if any) and helpers for progress reporting and cooperative cancellation.
+    Progress and cancel checks go through separate sessions, so the handler
+    decides when (and whether) its own changes are committed.
+    """
+
+    def __init__(self, db, job, stopping: threading.Event = None):
+        self.db = db
+        self.job = job
+        self.tenant = job.tenant
+        self._stopping = stopping
+
+    def progress(self, done: int, total: int = None, message: str = None):
+        values = {"progress": done, "heartbeat_at": datetime.utcnow()}
+        if total is not None:
+            values["total"] = total
+        if message is not None:
+            values["message"] = message
+        # Progress is advisory: if the handler is holding the write lock,
+        # skip this update rather than stall (or fail) the job.
+        _update_job(self.job.id, best_effort=True, **values)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self._stopping is not None and self._stopping.is_set():
+            raise JobInterrupted()
+
+        # Another session (the cancel endpoint) flips the flag, so re-read it.
+        db = SessionLocal()
+        try:
+            cancelled = db.execute(
+                select(models.Job.cancel_requested).where(models.Job.id == self.job.id)
+            ).scalar()
+        finally:
+            db.close()
+        if cancelled:
+            raise JobCancelled()
+
+
+# ---------- RUNNER ----------
+class JobRunner:
+    def __init__(self, max_workers: int = MAX_WORKERS, per_tenant_limit: int = PER_TENANT_LIMIT,
+                 poll_interval: float = POLL_INTERVAL, lease_seconds: float = LEASE_SECONDS):
+        self.max_workers = max_workers
+        self.per_tenant_limit = per_tenant_limit
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+
+        self._executor = None
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._active = set()  # job ids running in this process
+        self._last_purge = 0.0
+
+    # ----- lifecycle -----
+    def start(self):
+        if self._thread is not None:
+            return
+        self._recover_interrupted()
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crm-job")
+        self._thread = threading.Thread(target=self._loop, name="crm-job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        """
+        Stop dispatching and make running handlers bail out at their next
+        progress() / check_cancelled(); those jobs end as failed with
+        "Interrupted by shutdown". The pool threads are joined at interpreter
+        exit anyway, so without this a long export would hold up Ctrl-C,
+        --reload and worker restarts.
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._executor.shutdown(wait=wait)
+        self._thread = None
+        self._executor = None
+
+    def notify(self):
+        """Wake the dispatcher right away instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    # ----- public operations -----
+    def submit(self, db, kind: str, tenant=None, created_by: int = None):
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        _, needs_tenant = HANDLERS[kind]
+        if needs_tenant and tenant is None:
+            raise ValueError(f"Job kind '{kind}' requires a tenant")
+
+        job = crud.create_job(db, kind, tenant=tenant, created_by=created_by)
+        self.notify()
+        return job
+
+    def cancel(self, db, job):
+        """
+        Queued jobs are cancelled immediately; running jobs get a flag the
+        handler picks up on its next progress() / check_cancelled() call.
+        """
+        now = datetime.utcnow()
+        db.execute(
+            update(models.Job)
+            .where(models.Job.id == job.id, models.Job.status == "queued")
+            .values(status="cancelled", cancel_requested=True, finished_at=now)
+        )
+        db.execute(
+            update(models.Job)
+            .where(models.Job.id == job.id, models.Job.status == "running")
+            .values(cancel_requested=True)
+        )
+        db.commit()
+        db.refresh(job)
+        return job
+
+    # ----- dispatcher -----
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                self._renew_leases()
+                self._expire_leases()
+                self._purge_finished()
+                self._dispatch()
+            except Exception:
+                traceback.print_exc()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _dispatch(self):
+        db = SessionLocal()
+        try:
+            queued = (
+                db.query(models.Job.id, models.Job.tenant_id)
+                .filter(models.Job.status == "queued")
+                .order_by(models.Job.id)
+                .all()
+            )
+            for job_id, tenant_id in queued:
+                with self._lock:
+                    if len(self._active) >= self.max_workers:
+                        return
+                if not self._claim(db, job_id, tenant_id):
+                    continue
+                with self._lock:
+                    self._active.add(job_id)
+                self._executor.submit(self._run, job_id)
+        finally:
+            db.close()
+
+    def _claim(self, db, job_id: int, tenant_id):
+        """
+        Atomically flip one job from queued to running, but only while its
+        tenant is under the concurrency cap. Doing the count inside the same
+        UPDATE keeps the check race-free against concurrent claimers.
+        """
+        conditions = [models.Job.id == job_id, models.Job.status == "queued"]
+        if tenant_id is not None:
+            running = (
+                select(func.count(models.Job.id))
+                .where(models.Job.tenant_id == tenant_id, models.Job.status == "running")
+                .scalar_subquery()
+            )
+            conditions.append(running < self.per_tenant_limit)
+
+        now = datetime.utcnow()
+        claimed = db.execute(
+            update(models.Job)
+            .where(*conditions)
+            .values(status="running", started_at=now, heartbeat_at=now, worker=worker_id())
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return claimed.rowcount == 1
+
+    def _run(self, job_id: int):
+        try:
+            status, values = self._execute(job_id)
+        except Exception as exc:
+            # Anything that escaped the handler bookkeeping (missing row or
+            # handler, a locked database...) still has to end the job.
+            traceback.print_exc()
+            status, values = "failed", {"error": f"{type(exc).__name__}: {exc}"}
+
+        try:
+            _update_job(
+                job_id,
+                models.Job.status == "running",
+                status=status,
+                finished_at=datetime.utcnow(),
+                **values,
+            )
+        except Exception:
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+            # A slot just freed up (globally and for this tenant).
+            self.notify()
+
+    def _execute(self, job_id: int):
+        """Run the handler; returns the final (status, column values) for the job."""
+        db = JobSessionLocal()
+        try:
+            job = crud.get_job(db, job_id)
+            if job is None:
+                raise LookupError(f"Job {job_id} no longer exists")
+            if job.kind not in HANDLERS:
+                raise LookupError(f"No handler registered for job kind '{job.kind}'")
+            handler, _ = HANDLERS[job.kind]
+
+            ctx = JobContext(db, job, stopping=self._stopping)
+            try:
+                ctx.check_cancelled()
+                result = handler(ctx)
+                db.commit()
+            except JobCancelled:
+                db.rollback()
+                return "cancelled", {"message": "Cancelled"}
+            except JobInterrupted:
+                db.rollback()
+                return "failed", {"error": "Interrupted by shutdown"}
+            except Exception as exc:
+                db.rollback()
+                traceback.print_exc()
+                return "failed", {"error": f"{type(exc).__name__}: {exc}"}
+
+            values = {"result": json.dumps(result) if result is not None else None}
+            total = db.execute(select(models.Job.total).where(models.Job.id == job_id)).scalar()
+            if total is not None:
+                values["progress"] = total
+            return "succeeded", values
+        finally:
+            db.close()
+
+    def _renew_leases(self):
+        # Heartbeat every job this process is running, whatever the handler
+        # is doing, so only jobs of dead workers ever go stale.
+        with self._lock:
+            active = list(self._active)
+        if not active:
+            return
+        with engine.connect() as conn:
+            conn.execute(
+                update(models.Job)
+                .where(models.Job.id.in_(active), models.Job.status == "running")
+                .values(heartbeat_at=datetime.utcnow())
+            )
+            conn.commit()
+
+    def _expire_leases(self):
+        """
+        Fail running jobs whose lease ran out: their worker died (crash,
+        container restart, recreated host) without finishing them. Checked
+        on every poll, by every worker, so a sibling cleans up too.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        last_seen = func.coalesce(models.Job.heartbeat_at, models.Job.started_at)
+        with engine.connect() as conn:
+            conn.execute(
+                update(models.Job)
+                .where(
+                    models.Job.status == "running",
+                    (last_seen == None) | (last_seen < cutoff),  # noqa: E711
+                )
+                .values(status="failed", error="Worker lease expired", finished_at=datetime.utcnow())
+            )
+            conn.commit()
+
+    def _purge_finished(self, force: bool = False):
+        """
+        Delete finished jobs older than RETENTION_DAYS, plus their export
+        files. Runs at most once per PURGE_INTERVAL per worker.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+
+        cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+        db = SessionLocal()
+        try:
+            old = (
+                db.query(models.Job)
+                .filter(models.Job.status.in_(FINISHED_STATUSES), models.Job.finished_at < cutoff)
+                .all()
+            )
+            for job in old:
+                path = export_path(job)
+                if os.path.exists(path):
+                    os.remove(path)
+                db.delete(job)
+            db.commit()
+        finally:
+            db.close()
+
+    def _recover_interrupted(self):
+        """
+        At startup nothing runs in this process yet, so a "running" job that
+        names this very worker (the PID got reused after a restart, e.g. PID 1
+        in a container) is an orphan. Everything else is left to the lease.
+        """
+        with engine.connect() as conn:
+            conn.execute(
+                update(models.Job)
+                .where(models.Job.status == "running", models.Job.worker == worker_id())
+                .values(status="failed", error="Interrupted by server restart", finished_at=datetime.utcnow())
+            )
+            conn.commit()
+        self._expire_leases()
+
+
+runner = JobRunner()
+
+
+# -------------------------------------------------
+# BUILT-IN JOBS
+# -------------------------------------------------
+BATCH_SIZE = 200
+
+def export_path(job) -> str:
+    return os.path.join(EXPORT_DIR, f"job_{job.id}_contacts.json")
+
+
+@job_handler("export_contacts")
+def export_contacts(ctx: JobContext):
+    # The dump goes to a file; the job row only keeps a small summary.
+    contacts = crud.list_contacts(ctx.db, ctx.tenant)
+    total = len(contacts)
+    ctx.progress(0, total, "Exporting contacts")
+
+    rows = []
+    for i, contact in enumerate(contacts, start=1):
+        rows.append(crud.contact_to_contact_out(contact).model_dump())
+        if i % BATCH_SIZE == 0:
+            ctx.progress(i, message=f"Exported {i}/{total} contacts")
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = export_path(ctx.job)
+    with open(path, "w") as f:
+        json.dump({"tenant_code": ctx.tenant.code, "contacts": rows}, f)
+
+    return {"tenant_code": ctx.tenant.code, "count": total, "file": os.path.basename(path)}
+
+
+@job_handler("backfill_companies")
+def backfill_companies(ctx: JobContext):
+    """
+    Clear company_id on contacts whose company row no longer exists and
+    fill missing updated_at timestamps for the tenant's companies and contacts.
+    """
+    contacts = (
+        ctx.db.query(models.Contact)
+        .filter(models.Contact.tenant_id == ctx.tenant.id)
+        .order_by(models.Contact.id)
+        .all()
+    )
+    total = len(contacts)
+    ctx.progress(0, total, "Backfilling contacts")
+
+    fixed = 0
+    for i, contact in enumerate(contacts, start=1):
+        if contact.company_id is not None and contact.company is None:
+            contact.company_id = None
+            fixed += 1
+        if contact.updated_at is None:
+            contact.updated_at = contact.created_at or datetime.utcnow()
+            fixed += 1
+        if i % BATCH_SIZE == 0:
+            ctx.progress(i, message=f"Checked {i}/{total} contacts")
+
+    companies = ctx.db.query(models.Company).filter(models.Company.tenant_id == ctx.tenant.id).all()
+    for company in companies:
+        if company.updated_at is None:
+            company.updated_at = company.created_at or datetime.utcnow()
+            fixed += 1
+
+    ctx.db.commit()
+    return {"tenant_code": ctx.tenant.code, "rows_fixed": fixed}
+
+
+@job_handler("reseed_tenants", needs_tenant=False)
+def reseed_tenants(ctx: JobContext):
+    # Same data as seed_tenant.py, without tying up a request or a shell.
+    tenants_seed = [
+        ("Home Depot", "home_depot", "#F96302"),
+        ("Walmart", "walmart", "#0071CE"),
+        ("Target", "target", "#CC0000"),
+    ]
+    ctx.progress(0, len(tenants_seed), "Seeding tenants")
+
+    created = []
+    for i, (name, code, color) in enumerate(tenants_seed, start=1):
+        if not crud.get_tenant_by_code(ctx.db, code):
+            crud.create_tenant(ctx.db, name=name, code=code, primary_color=color)
+            created.append(code)
+        ctx.progress(i)
+
+    return {"created": created}
@@ -1,7 +1,8 @@
 from datetime import datetime
+from itertools import chain
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, event, text
+from sqlalchemy.orm import Session, relationship
 
 from .database import Base
 
@@ -18,6 +19,7 @@ class Tenant(Base):
     users = relationship("User", back_populates="tenant")
     companies = relationship("Company", back_populates="tenant")
     contacts = relationship("Contact", back_populates="tenant")
+    jobs = relationship("Job", back_populates="tenant")
 
 
 class User(Base):
@@ -68,3 +70,64 @@ class Contact(Base):
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # "export_contacts", "reseed_tenants", ...
+    status = Column(String, index=True, default="queued")  # queued / running / succeeded / failed / cancelled
+    progress = Column(Integer, default=0)
+    total = Column(Integer, nullable=True)
+    message = Column(String, nullable=True)
+    result = Column(Text, nullable=True)  # JSON payload written by the handler
+    error = Column(Text, nullable=True)
+    cancel_requested = Column(Boolean, default=False)
+    worker = Column(String, nullable=True)  # "hostname:pid" of the process running it
+    heartbeat_at = Column(DateTime, nullable=True)  # lease: renewed while the owner is alive
+
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True)
+    tenant = relationship("Tenant", back_populates="jobs")
+
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class CacheVersion(Base):
+    """
+    One counter per cached table. Bumped in the same transaction as any
+    ORM write to that table, polled by every worker's cache (see cache.py).
+    """
+    __tablename__ = "cache_versions"
+
+    scope = Column(String, primary_key=True)  # "tenants", "users"
+    version = Column(Integer, nullable=False, default=0)
+
+
+# ---------- CACHE INVALIDATION ----------
+CACHED_MODELS = (Tenant, User)
+
+BUMP_CACHE_VERSION = text(
+    "INSERT INTO cache_versions (scope, version) VALUES (:scope, 1) "
+    "ON CONFLICT(scope) DO UPDATE SET version = version + 1"
+)
+
+def bump_cache_version(connection, scope: str):
+    """For writes that bypass the ORM flush (bulk UPDATE/DELETE, raw SQL)."""
+    connection.execute(BUMP_CACHE_VERSION, {"scope": scope})
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_cache_versions(session, flush_context):
+    # new/dirty/deleted still hold the pre-flush state here
+    scopes = {
+        obj.__tablename__
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if isinstance(obj, CACHED_MODELS) and (obj not in session.dirty or session.is_modified(obj))
+    }
+    for scope in sorted(scopes):
+        bump_cache_version(session.connection(), scope)
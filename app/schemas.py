@@ -1,5 +1,6 @@
 # schemas.py
-from typing import Optional
+from datetime import datetime
+from typing import Any, Optional
 from pydantic import BaseModel, EmailStr
 
 # ---------- TENANTS ----------
@@ -103,3 +104,28 @@ class CustomerCreate(ContactBase):
 
 class CustomerOut(ContactOut):
     pass
+
+
+# ---------- JOBS ----------
+class JobCreate(BaseModel):
+    kind: str       # "export_contacts", "reseed_tenants", "backfill_companies"
+    tenant_code: Optional[str] = None
+
+class JobSummaryOut(BaseModel):
+    id: int
+    kind: str
+    status: str
+    progress: int = 0
+    total: Optional[int] = None
+    message: Optional[str] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    tenant_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+class JobOut(JobSummaryOut):
+    result: Optional[Any] = None
@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+import pytest
+
+# Point the app at a throwaway database before anything imports it.
+_TMP = tempfile.mkdtemp(prefix="crm-tests-")
+os.environ["CRM_DATABASE_URL"] = f"sqlite:///{_TMP}/test.db"
+os.environ["CRM_EXPORT_DIR"] = os.path.join(_TMP, "exports")
+
+from app import cache, crud, jobs, models  # noqa: E402
+from app.database import Base, SessionLocal, engine, init_db  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_handlers(monkeypatch):
+    # Handlers registered by a test must not leak into later tests/runners.
+    monkeypatch.setattr(jobs, "HANDLERS", dict(jobs.HANDLERS))
+
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+        # cache_versions was wiped too, so counters restart from 0
+        cache.tenant_cache.clear()
+        cache.user_cache.clear()
+
+
+@pytest.fixture
+def tenant(db):
+    return crud.create_tenant(db, name="Home Depot", code="home_depot", primary_color="#F96302")
+
+
+@pytest.fixture
+def other_tenant(db):
+    return crud.create_tenant(db, name="Walmart", code="walmart", primary_color="#0071CE")
+
+
+def add_contacts(db, tenant, count, company_name="Acme"):
+    company = models.Company(name=company_name, tenant_id=tenant.id)
+    db.add(company)
+    db.flush()
+    for i in range(count):
+        db.add(models.Contact(name=f"Contact {i}", tenant_id=tenant.id, company_id=company.id))
+    db.commit()
@@ -0,0 +1,114 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app import cache, crud, jobs, models
+from app.database import SessionLocal, engine
+
+from .conftest import add_contacts
+
+
+def in_other_worker(fn):
+    # A separate session/connection, as another uvicorn worker would use.
+    session = SessionLocal()
+    try:
+        fn(session)
+        session.commit()
+    finally:
+        session.close()
+
+
+def counting_loader(calls, value="value"):
+    def loader():
+        calls.append(1)
+        return value
+    return loader
+
+
+def test_tenant_write_elsewhere_invalidates_tenant_cache(db, tenant):
+    assert crud.get_cached_tenant_by_code(db, "home_depot").name == "Home Depot"
+
+    def rename(session):
+        session.query(models.Tenant).filter_by(code="home_depot").one().name = "HD"
+    in_other_worker(rename)
+
+    fresh = SessionLocal()  # next request, next session
+    try:
+        assert crud.get_cached_tenant_by_code(fresh, "home_depot").name == "HD"
+    finally:
+        fresh.close()
+
+
+def test_unrelated_writes_keep_the_cache_warm(db, tenant):
+    calls = []
+    store = cache.VersionedCache(cache.watcher, "tenants")
+    loader = counting_loader(calls)
+    store.get("k", loader)
+
+    # Contacts, job progress and lease heartbeats all commit...
+    add_contacts(db, tenant, 3)
+    runner = jobs.JobRunner()
+    job = runner.submit(db, "export_contacts", tenant=tenant)
+    assert runner._claim(db, job.id, job.tenant_id)
+    runner._active.add(job.id)
+    runner._renew_leases()
+    jobs.JobContext(db, job).progress(1, 2)
+    store.get("k", loader)
+    assert len(calls) == 1
+
+    # ...but only a tenants write drops the tenant cache.
+    crud.create_tenant(db, name="Walmart", code="walmart")
+    store.get("k", loader)
+    assert len(calls) == 2
+
+
+def test_user_cache_ignores_tenant_writes(db, tenant):
+    calls = []
+    store = cache.VersionedCache(cache.watcher, "users")
+    loader = counting_loader(calls)
+    store.get("k", loader)
+
+    crud.create_tenant(db, name="Walmart", code="walmart")
+    store.get("k", loader)
+    assert len(calls) == 1
+
+
+def test_deleted_user_is_not_served_from_cache(db, tenant):
+    user = models.User(full_name="Rep", email="rep@homedepot.com", password_hash="x",
+                       role="rep", tenant_id=tenant.id)
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    assert crud.get_cached_user(db, user_id).role == "rep"
+
+    in_other_worker(lambda session: session.delete(session.get(models.User, user_id)))
+    assert crud.get_cached_user(db, user_id) is None
+
+
+def test_raw_sql_writes_bump_explicitly(db, tenant):
+    calls = []
+    store = cache.VersionedCache(cache.watcher, "tenants")
+    loader = counting_loader(calls)
+    store.get("k", loader)
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE tenants SET primary_color = '#000000'"))
+        models.bump_cache_version(conn, "tenants")
+    store.get("k", loader)
+    assert len(calls) == 2
+
+
+def test_health_reports_import_and_init_time(db):
+    from app.main import app
+
+    with TestClient(app) as client:
+        body = client.get("/health").json()
+    assert body["import_ms"] > 0
+    assert body["startup_ms"] == round(body["import_ms"] + body["init_ms"], 1)
+
+
+def test_normal_start_stays_within_budget(db, capsys):
+    from app.main import app
+
+    with TestClient(app):
+        pass
+    assert "WARNING: startup" not in capsys.readouterr().out
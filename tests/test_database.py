@@ -0,0 +1,22 @@
+from sqlalchemy import inspect
+
+from app import database
+from app.database import engine
+
+
+def test_init_db_adds_columns_missing_from_existing_tables(db):
+    # A jobs table created before worker/heartbeat_at existed.
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE jobs")
+        conn.exec_driver_sql(
+            "CREATE TABLE jobs (id INTEGER PRIMARY KEY, kind VARCHAR NOT NULL, status VARCHAR, "
+            "progress INTEGER, total INTEGER, message VARCHAR, result TEXT, error TEXT, "
+            "cancel_requested BOOLEAN, tenant_id INTEGER, created_by INTEGER, "
+            "created_at DATETIME, started_at DATETIME, finished_at DATETIME)"
+        )
+
+    database._add_missing_columns()
+    columns = {c["name"] for c in inspect(engine).get_columns("jobs")}
+    assert {"worker", "heartbeat_at"} <= columns
+
+    database._add_missing_columns()  # idempotent
@@ -0,0 +1,274 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import crud, jobs, models
+from app.database import SessionLocal, engine
+
+from .conftest import add_contacts
+
+
+def reload(db, job):
+    db.expire_all()
+    return crud.get_job(db, job.id)
+
+
+def claim(runner, db, job):
+    return runner._claim(db, job.id, job.tenant_id)
+
+
+def run(runner, db, job):
+    assert claim(runner, db, job)
+    runner._run(job.id)
+    return reload(db, job)
+
+
+def test_claim_respects_per_tenant_limit(db, tenant, other_tenant):
+    runner = jobs.JobRunner(per_tenant_limit=1)
+    first = runner.submit(db, "export_contacts", tenant=tenant)
+    second = runner.submit(db, "export_contacts", tenant=tenant)
+    elsewhere = runner.submit(db, "export_contacts", tenant=other_tenant)
+
+    assert claim(runner, db, first)
+    assert not claim(runner, db, second)
+    assert claim(runner, db, elsewhere)
+    assert reload(db, second).status == "queued"
+
+    runner._run(first.id)
+    assert claim(runner, db, second)
+
+
+def test_cancel_queued_job_is_immediate(db, tenant):
+    runner = jobs.JobRunner()
+    job = runner.submit(db, "export_contacts", tenant=tenant)
+
+    job = runner.cancel(db, job)
+    assert job.status == "cancelled"
+    assert job.finished_at is not None
+    assert not claim(runner, db, job)
+
+
+def test_cancel_running_job_stops_handler_and_rolls_back(db, tenant):
+    seen = []
+
+    @jobs.job_handler("test_cancel_midway")
+    def handler(ctx):
+        ctx.db.add(models.Contact(name="half-done", tenant_id=ctx.tenant.id))
+        seen.append("started")
+        # The cancel endpoint comes in on its own session while we work.
+        other = SessionLocal()
+        try:
+            runner.cancel(other, crud.get_job(other, ctx.job.id))
+        finally:
+            other.close()
+        ctx.progress(1, 2)
+        seen.append("not reached")
+
+    runner = jobs.JobRunner()
+    job = runner.submit(db, "test_cancel_midway", tenant=tenant)
+    job = run(runner, db, job)
+
+    assert job.status == "cancelled"
+    assert len(seen) == 1
+    assert db.query(models.Contact).filter_by(name="half-done").count() == 0
+
+
+def test_progress_is_skipped_while_handler_holds_write_lock(db, tenant):
+    @jobs.job_handler("test_flushed_progress")
+    def handler(ctx):
+        ctx.db.add(models.Contact(name="flushed", tenant_id=ctx.tenant.id))
+        ctx.db.flush()  # the handler now holds SQLite's write lock
+        ctx.progress(1, 2, "halfway")
+        return {"ok": True}
+
+    runner = jobs.JobRunner()
+    job = run(runner, db, runner.submit(db, "test_flushed_progress", tenant=tenant))
+
+    assert job.status == "succeeded"
+    assert db.query(models.Contact).filter_by(name="flushed").count() == 1
+
+
+def test_handler_error_marks_job_failed(db, tenant):
+    @jobs.job_handler("test_boom")
+    def handler(ctx):
+        raise RuntimeError("boom")
+
+    runner = jobs.JobRunner()
+    job = run(runner, db, runner.submit(db, "test_boom", tenant=tenant))
+
+    assert job.status == "failed"
+    assert "boom" in job.error
+    assert job.id not in runner._active
+
+
+def test_unknown_kind_in_queue_marks_job_failed(db, tenant):
+    runner = jobs.JobRunner()
+    job = crud.create_job(db, "from_a_newer_version", tenant=tenant)
+    job = run(runner, db, job)
+
+    assert job.status == "failed"
+    assert "from_a_newer_version" in job.error
+
+
+def test_export_writes_file_without_per_row_queries(db, tenant):
+    add_contacts(db, tenant, 500)
+    runner = jobs.JobRunner()
+    job = runner.submit(db, "export_contacts", tenant=tenant)
+    assert claim(runner, db, job)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        runner._run(job.id)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    job = reload(db, job)
+    assert job.status == "succeeded"
+    assert job.progress == job.total == 500
+    assert json.loads(job.result)["count"] == 500
+    assert len(statements) < 30
+
+    with open(jobs.export_path(job)) as f:
+        assert len(json.load(f)["contacts"]) == 500
+
+
+def test_stop_interrupts_running_handlers_as_failed(db, tenant):
+    started = threading.Event()
+
+    @jobs.job_handler("test_long_running")
+    def handler(ctx):
+        started.set()
+        while True:
+            ctx.check_cancelled()
+            time.sleep(0.01)
+
+    runner = jobs.JobRunner(poll_interval=0.05)
+    runner.start()
+    job = runner.submit(db, "test_long_running", tenant=tenant)
+    assert started.wait(5)
+    runner.stop()
+
+    job = reload(db, job)
+    assert job.status == "failed"
+    assert job.error == "Interrupted by shutdown"
+    assert not job.cancel_requested
+
+
+def test_list_jobs_is_paged(db, tenant):
+    runner = jobs.JobRunner()
+    ids = [runner.submit(db, "export_contacts", tenant=tenant).id for _ in range(5)]
+
+    page = crud.list_jobs(db, limit=2, offset=1)
+    assert [j.id for j in page] == ids[::-1][1:3]
+
+
+def test_purge_removes_old_finished_jobs_and_exports(db, tenant):
+    runner = jobs.JobRunner()
+    old = run(runner, db, runner.submit(db, "export_contacts", tenant=tenant))
+    recent = run(runner, db, runner.submit(db, "export_contacts", tenant=tenant))
+    queued = runner.submit(db, "export_contacts", tenant=tenant)
+    old_id, old_path = old.id, jobs.export_path(old)
+    recent_id, queued_id = recent.id, queued.id
+    assert os.path.exists(old_path)
+
+    old.finished_at = datetime.utcnow() - timedelta(days=jobs.RETENTION_DAYS + 1)
+    db.commit()
+    runner._purge_finished(force=True)
+
+    db.expire_all()
+    assert crud.get_job(db, old_id) is None
+    assert not os.path.exists(old_path)
+    assert crud.get_job(db, recent_id) is not None
+    assert crud.get_job(db, queued_id) is not None
+
+
+def test_list_jobs_leaves_out_results(db, tenant):
+    from app.main import app
+
+    admin = models.User(full_name="Admin", email="admin@crm.com", password_hash="x",
+                        role="superadmin", tenant_id=tenant.id)
+    db.add(admin)
+    db.commit()
+
+    runner = jobs.JobRunner()
+    job = run(runner, db, runner.submit(db, "export_contacts", tenant=tenant))
+    assert job.status == "succeeded"
+
+    client = TestClient(app)  # no lifespan: the global runner stays off
+    headers = {"user_id": str(admin.id)}
+    listed = client.get("/jobs", headers=headers).json()
+    assert listed and "result" not in listed[0]
+
+    detail = client.get(f"/jobs/{job.id}", headers=headers).json()
+    assert detail["result"]["count"] == 0
+
+    download = client.get(f"/jobs/{job.id}/download", headers=headers)
+    assert download.status_code == 200
+    assert download.json()["tenant_code"] == "home_depot"
+
+
+def test_stale_lease_is_failed_whatever_the_owner(db, tenant):
+    runner = jobs.JobRunner(lease_seconds=60)
+    job = runner.submit(db, "export_contacts", tenant=tenant)
+    assert claim(runner, db, job)
+
+    # Owner looks alive (reused PID) on a host that no longer exists.
+    job = reload(db, job)
+    job.worker = "old-container:1"
+    job.heartbeat_at = datetime.utcnow() - timedelta(minutes=5)
+    db.commit()
+
+    blocked = runner.submit(db, "export_contacts", tenant=tenant)
+    assert not claim(runner, db, blocked)
+
+    runner._expire_leases()
+    job = reload(db, job)
+    assert job.status == "failed"
+    assert "lease" in job.error
+    assert claim(runner, db, blocked)
+
+
+def test_fresh_lease_is_left_alone(db, tenant):
+    runner = jobs.JobRunner(lease_seconds=60)
+    job = runner.submit(db, "export_contacts", tenant=tenant)
+    assert claim(runner, db, job)
+
+    job = reload(db, job)
+    job.worker = "sibling-host:4242"
+    db.commit()
+
+    runner._expire_leases()
+    runner._recover_interrupted()
+    assert reload(db, job).status == "running"
+
+
+def test_restart_fails_jobs_claimed_under_our_own_worker_id(db, tenant):
+    runner = jobs.JobRunner(lease_seconds=60)
+    job = runner.submit(db, "export_contacts", tenant=tenant)
+    assert claim(runner, db, job)  # claimed as this host:pid, lease still fresh
+
+    runner._recover_interrupted()
+    job = reload(db, job)
+    assert job.status == "failed"
+    assert "restart" in job.error
+
+
+def test_renew_leases_heartbeats_active_jobs(db, tenant):
+    runner = jobs.JobRunner()
+    job = runner.submit(db, "export_contacts", tenant=tenant)
+    assert claim(runner, db, job)
+    old = datetime.utcnow() - timedelta(minutes=5)
+    job = reload(db, job)
+    job.heartbeat_at = old
+    db.commit()
+
+    runner._active.add(job.id)
+    runner._renew_leases()
+    assert reload(db, job).heartbeat_at > old